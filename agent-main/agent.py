@@ -9,10 +9,11 @@ import os
 import asyncio
 import logging
 import tempfile
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
 from dotenv import load_dotenv
-from requests import get, post
+from requests import post
 import requests
 import modal
 from anthropic import Anthropic
@@ -36,6 +37,10 @@ load_dotenv()
 
 model = whisper.load_model("base")
 
+# Lightweight MCP tools share one warm container behind the dispatch endpoint,
+# which routes on the "tool" field of the request body
+MCP_DISPATCH_URL = "https://antlaf6--mcp-dispatch-dev.modal.run"
+
 
 @dataclass
 class AgentConfig:
@@ -48,6 +53,68 @@ class AgentConfig:
     max_iterations: int = 1
 
 
+@lru_cache(maxsize=8)
+def build_system_prompt(tools: Tuple[Tuple[str, str], ...]) -> str:
+    """Create the system prompt for the given (name, description) tool pairs."""
+    base_prompt = """You are an assistant to a patient suffering of dementia. You are tasked with assuring the safety of this person.
+
+Your workflow:
+1. Analyze the provided JSON context (this is a segmented view of the what the person's environment looks like)
+2. Determine if any available tools would be helpful
+3. If tools are needed, respond with a structured decision indicating which tools to use and why
+4. If no tools are needed, provide a direct analysis/response
+
+Available tools:"""
+
+    if tools:
+        tools_desc = "\n".join(
+            [f"- {name}: {description}" for name, description in tools]
+        )
+        base_prompt += f"\n{tools_desc}"
+    else:
+        base_prompt += "\nNo tools are currently available."
+
+    base_prompt += """
+
+When you want to use tools, respond in this JSON format:
+{
+    "decision": "use_tools",
+    "reasoning": "Brief explanation of why tools are needed",
+    "tools_to_use": [
+        {
+            "tool_name": "tool_name",
+            "parameters": {...},
+            "purpose": "what this tool call will accomplish"
+        }
+    ]
+}
+
+When no tools are needed, respond in this JSON format:
+{
+    "decision": "direct_response", 
+    "reasoning": "Why no tools are needed",
+    "response": "Your analysis/answer to the context"
+}
+
+Always be concise and focused on the key decisions and insights.
+
+Here are some basic rules:
+
+examples for calling the PEOPLE tool:
+
+    If the person is seeing someone's face, always call the tool to remember the name and return its response. If you feel like you should update the person in question's profile, don't hesitate to do so.
+
+examples for calling the TIMER tool:
+
+    if the person is manipulating a kettle and setting it on the stove, set an timer for it (about 10 mins).
+
+    if the person says that they should do something in x amount of minutes, add a timer for x minutes, as they said. 
+
+"""
+
+    return base_prompt
+
+
 class MinimalistAgent:
     """
     A minimalist agent that uses Anthropic API and can decide to use MCP tools.
@@ -62,7 +129,7 @@ class MinimalistAgent:
         self.mcp_sessions: Dict[str, Any] = {}
         self.available_tools = []
 
-        yoyo = get("https://antlaf6--mcp-list-tools-dev.modal.run")
+        yoyo = post(MCP_DISPATCH_URL, json={"tool": "list_tools"})
         tools = str(yoyo.json())
 
         self.available_tools = json.loads(tools.lower().replace("'", '"'))["tools"]
@@ -113,66 +180,30 @@ class MinimalistAgent:
 
     def create_system_prompt(self) -> str:
         """Create the system prompt including available tools."""
-        base_prompt = """You are an assistant to a patient suffering of dementia. You are tasked with assuring the safety of this person.
-
-Your workflow:
-1. Analyze the provided JSON context (this is a segmented view of the what the person's environment looks like)
-2. Determine if any available tools would be helpful
-3. If tools are needed, respond with a structured decision indicating which tools to use and why
-4. If no tools are needed, provide a direct analysis/response
-
-Available tools:"""
-
-        if self.available_tools:
-            tools_desc = "\n".join(
-                [
-                    f"- {tool['name']}: {tool['description']}"
-                    for tool in self.available_tools
-                ]
+        # Agents are built per request, so the prompt is cached at module level
+        # on the tool names and descriptions
+        return build_system_prompt(
+            tuple(
+                (tool["name"], tool["description"]) for tool in self.available_tools
             )
-            base_prompt += f"\n{tools_desc}"
-        else:
-            base_prompt += "\nNo tools are currently available."
-
-        base_prompt += """
-
-When you want to use tools, respond in this JSON format:
-{
-    "decision": "use_tools",
-    "reasoning": "Brief explanation of why tools are needed",
-    "tools_to_use": [
-        {
-            "tool_name": "tool_name",
-            "parameters": {...},
-            "purpose": "what this tool call will accomplish"
-        }
-    ]
-}
-
-When no tools are needed, respond in this JSON format:
-{
-    "decision": "direct_response", 
-    "reasoning": "Why no tools are needed",
-    "response": "Your analysis/answer to the context"
-}
-
-Always be concise and focused on the key decisions and insights.
-
-Here are some basic rules:
-
-examples for calling the PEOPLE tool:
-
-    If the person is seeing someone's face, always call the tool to remember the name and return its response. If you feel like you should update the person in question's profile, don't hesitate to do so.
-
-examples for calling the TIMER tool:
-
-    if the person is manipulating a kettle and setting it on the stove, set an timer for it (about 10 mins).
+        )
 
-    if the person says that they should do something in x amount of minutes, add a timer for x minutes, as they said. 
+    def _transcribe_audio(self, audio_data: str) -> Dict[str, Any]:
+        """Transcribe base64 M4A audio with Whisper (blocking)."""
+        # Convert base64 to bytes and save as temporary M4A file for Whisper
+        audio_bytes = b64decode(audio_data)
 
-"""
+        # Create a temporary file with .m4a extension
+        with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as temp_file:
+            temp_file.write(audio_bytes)
+            temp_file_path = temp_file.name
 
-        return base_prompt
+        try:
+            # Use Whisper to transcribe directly from the M4A file
+            return model.transcribe(temp_file_path)
+        finally:
+            # Clean up the temporary file
+            os.unlink(temp_file_path)
 
     async def process_context(self, audio_data: str, image_data: str) -> Dict[str, Any]:
         """
@@ -188,22 +219,11 @@ examples for calling the TIMER tool:
 
         system_prompt = self.create_system_prompt()
 
-        # Convert base64 to bytes and save as temporary M4A file for Whisper
+        # Decoding, temp file I/O and Whisper all block, so run them off the event loop
         try:
-            audio_bytes = b64decode(audio_data)
-
-            # Create a temporary file with .m4a extension
-            with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as temp_file:
-                temp_file.write(audio_bytes)
-                temp_file_path = temp_file.name
-
-            # Use Whisper to transcribe directly from the M4A file
-            context = model.transcribe(temp_file_path)
+            context = await asyncio.to_thread(self._transcribe_audio, audio_data)
 
-            # Clean up the temporary file
-            os.unlink(temp_file_path)
-
-            logger.info(contet)
+            logger.info(context)
 
         except Exception as e:
             logger.error(f"Error processing M4A audio: {e}")
@@ -278,18 +298,23 @@ examples for calling the TIMER tool:
         """Execute the requested MCP tools."""
         results = []
 
+        # Endpoint URL and dispatch "tool" value for each tool; face recognition
+        # keeps its own endpoint
         table = {
-            "ping": "https://antlaf6--mcp-ping-dev.modal.run",
-            "timer_endpoint": "https://antlaf6--mcp-timer-dev.modal.run",
-            "location_endpoint": "https://antlaf6--mcp-location-dev.modal.run",
-            "list_tools_endpoint": "https://antlaf6--mcp-list-tools-dev.modal.run",
-            "recognize_face": "https://antlaf6--mcp-face-recognition-dev.modal.run",
-            "health_endpoint": "https://antlaf6--mcp-health-dev.modal.run",
+            "ping": (MCP_DISPATCH_URL, "ping"),
+            "timer_endpoint": (MCP_DISPATCH_URL, "manage_timer"),
+            "location_endpoint": (MCP_DISPATCH_URL, "monitor_location"),
+            "list_tools_endpoint": (MCP_DISPATCH_URL, "list_tools"),
+            "recognize_face": (
+                "https://antlaf6--mcp-face-recognition-dev.modal.run",
+                None,
+            ),
+            "health_endpoint": (MCP_DISPATCH_URL, "health"),
         }
 
         for tool_request in tools_to_use:
             logger.info(tool_request)
-            tool_url = table[tool_request["tool_name"]]
+            tool_url, dispatch_tool = table[tool_request["tool_name"]]
 
             # get the args
             args = self.anthropic.messages.create(
@@ -306,17 +331,15 @@ examples for calling the TIMER tool:
 
             # Find which server has this tool
             logger.info("calling tool", tool_url, " with args, ", args.content[0].text)
+            payload = {
+                "person_name": " jbfkwjbfkejw efjen",
+                "person_relationship": "jewnje",
+                "image_data": image_data["data"],
+            }
+            if dispatch_tool:
+                payload["tool"] = dispatch_tool
             try:
-                requests.post(
-                    tool_url,
-                    data=json.dumps(
-                        {
-                            "person_name": " jbfkwjbfkejw efjen",
-                            "person_relationship": "jewnje",
-                            "image_data": image_data["data"],
-                        }
-                    ),
-                )
+                requests.post(tool_url, data=json.dumps(payload))
             except:
                 raise ValueError("got an error sending request")
 
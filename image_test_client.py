@@ -1,6 +1,7 @@
 import requests
 import json
 import base64
+import os
 from pathlib import Path
 
 # Replace with your actual Modal endpoint URL
@@ -8,6 +9,16 @@ MODAL_ENDPOINT_URL = (
     "https://antlaf6--minimalist-anthropic-agent-analyze-context--81a139-dev.modal.run"
 )
 
+# Media types keyed by lowercased file extension
+_MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".webp": "image/webp",
+}
+
 
 def encode_image_to_base64(image_path: str) -> dict:
     """
@@ -19,22 +30,12 @@ def encode_image_to_base64(image_path: str) -> dict:
     Returns:
         dict: Contains 'data' (base64 string) and 'media_type'
     """
-    path = Path(image_path)
-    if not path.exists():
+    if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image file not found: {image_path}")
 
     # Determine media type based on file extension
-    extension = path.suffix.lower()
-    media_type_map = {
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".gif": "image/gif",
-        ".bmp": "image/bmp",
-        ".webp": "image/webp",
-    }
-
-    media_type = media_type_map.get(extension, "image/jpeg")
+    extension = os.path.splitext(image_path)[1].lower()
+    media_type = _MEDIA_TYPES.get(extension, "image/jpeg")
 
     # Read and encode the image
     with open(image_path, "rb") as image_file:
@@ -21,9 +21,11 @@ CREATE TABLE IF NOT EXISTS faces (
 );
 
 -- Create index for vector similarity search (using cosine similarity)
-CREATE INDEX IF NOT EXISTS faces_embedding_idx ON faces 
-USING ivfflat (face_embedding vector_cosine_ops) 
-WITH (lists = 100);
+-- HNSW needs no training data, so it keeps good recall while the table is small
+-- (ivfflat with 100 lists is built from whatever rows exist at creation time)
+DROP INDEX IF EXISTS faces_embedding_idx; -- replaces the earlier ivfflat index
+CREATE INDEX IF NOT EXISTS faces_embedding_hnsw_idx ON faces 
+USING hnsw (face_embedding vector_cosine_ops);
 
 -- Create index for name searches
 CREATE INDEX IF NOT EXISTS faces_name_idx ON faces (name);
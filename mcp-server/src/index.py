@@ -5,19 +5,24 @@ Python translation of the MCP server for dementia aid tools with integrated face
 """
 
 import asyncio
-import base64
-import io
+import binascii
 import json
 import logging
 import os
+import random
 import signal
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from enum import IntEnum
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 import cv2
 import numpy as np
-from PIL import Image
+import orjson
 import modal
 from mcp import ClientSession, StdioServerParameters
 from mcp.server import Server
@@ -32,78 +37,186 @@ from mcp.types import (
     Tool,
 )
 
+# Predefined set of nice hex colors for UI display
+HEX_COLORS = (
+    "#FF6B6B",  # Red
+    "#4ECDC4",  # Teal
+    "#45B7D1",  # Blue
+    "#96CEB4",  # Green
+    "#FFEAA7",  # Yellow
+    "#DDA0DD",  # Plum
+    "#FFB6C1",  # Light Pink
+    "#98D8C8",  # Mint
+    "#F7DC6F",  # Gold
+    "#BB8FCE",  # Lavender
+    "#85C1E9",  # Sky Blue
+    "#F8C471",  # Orange
+)
+
+
+class ErrCode(IntEnum):
+    """Error codes returned in the "code" field of failed responses"""
+
+    OK = 0
+    MISSING_IMAGE = 1
+    DB_DOWN = 2
+    INVALID_IMAGE = 3
+    UNKNOWN = 99
+
+
+class InvalidImageError(Exception):
+    """Raised when image data cannot be decoded"""
+
+
+# Top-level packages whose exceptions mean the database could not be reached;
+# PostgREST errors (bad payloads, constraint violations) are not outages
+DB_ERROR_MODULES = ("httpx", "httpcore")
+
+
+def error_fields(error: Exception) -> Dict[str, Any]:
+    """Classify an exception into response fields without formatting its message"""
+    if isinstance(error, InvalidImageError):
+        code = ErrCode.INVALID_IMAGE
+    elif type(error).__module__.partition(".")[0] in DB_ERROR_MODULES:
+        code = ErrCode.DB_DOWN
+    else:
+        code = ErrCode.UNKNOWN
+    return {"code": int(code), "error": code.name}
+
 
 class PythonFaceRecognitionService:
     """Integrated face recognition service directly in MCP server"""
 
     def __init__(self):
-        # Load OpenCV face cascade classifier
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        )
+        # OpenCV face cascade classifiers are not thread-safe, so each
+        # detection worker thread loads its own (see _face_cascade)
+        self._local = threading.local()
 
-        # Face tracking state
+        # Face tracking state, shared by detection workers; previous face
+        # boxes are kept as an (N, 4) left/top/right/bottom array
         self.previous_faces = []
+        self._prev_boxes = np.empty((0, 4), dtype=np.int32)
+        self._tracking_lock = threading.Lock()
         self.face_tracking_threshold = 0.3  # IoU threshold for face tracking
         self.min_face_confidence = 0.6  # Minimum confidence for face acceptance
         self.max_faces = 5  # Maximum number of faces to track
+        self.detection_max_side = 640  # Longest side of the frame used for detection
+        # Never shrink below the cascade's 24px window for a 50px face
+        self.min_detection_scale = 24 / 50
+
+        # Detection runs off the event loop; OpenCV releases the GIL so
+        # concurrent requests detect in parallel
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="face-detect")
 
         # Face detection only - database operations handled by MCP server
         self.similarity_threshold = 0.7  # Threshold for person matching
 
+        # Cached database embeddings for similarity search
+        self.embedding_dim = 512
+        self.db_cache_ttl = 30.0  # Seconds before re-reading faces from Supabase
+        self._db_rows: Optional[List[Dict[str, Any]]] = None
+        self._db_matrix_norm = np.empty((0, self.embedding_dim), dtype=np.float32)
+        self._db_loaded_at = 0.0
+
         logger.info("Face detection service initialized with OpenCV and face tracking")
 
-    def decode_image(self, base64_image: str) -> np.ndarray:
-        """Decode base64 image to numpy array"""
+    def _face_cascade(self) -> cv2.CascadeClassifier:
+        """Return the face cascade classifier owned by the calling thread"""
+        face_cascade = getattr(self._local, "face_cascade", None)
+        if face_cascade is None:
+            # Load OpenCV face cascade classifier
+            face_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+            )
+            self._local.face_cascade = face_cascade
+        return face_cascade
+
+    def _imdecode(self, base64_image: str, flags: int) -> np.ndarray:
+        """Decode base64 image data straight into an OpenCV array"""
         try:
             # Remove data URL prefix if present
-            if "," in base64_image:
-                base64_image = base64_image.split(",")[1]
-
-            # Decode base64
-            image_data = base64.b64decode(base64_image)
-
-            # Convert to PIL Image
-            image = Image.open(io.BytesIO(image_data))
-
-            # Convert to RGB if necessary
-            if image.mode != "RGB":
-                image = image.convert("RGB")
+            base64_image = base64_image.rpartition(",")[2]
 
-            # Convert to numpy array
-            image_array = np.array(image)
+            # Decode base64 straight from the str buffer (b64decode would first
+            # copy it to ASCII bytes) and view the result without another copy
+            buffer = np.frombuffer(binascii.a2b_base64(base64_image), dtype=np.uint8)
+            image_array = cv2.imdecode(buffer, flags)
+            if image_array is None:
+                raise ValueError("unsupported or corrupt image")
 
             return image_array
 
         except Exception as e:
             logger.error(f"Error decoding image: {e}")
-            raise Exception(f"Invalid image data: {e}")
+            raise InvalidImageError(f"Invalid image data: {e}")
+
+    def decode_image(self, base64_image: str) -> np.ndarray:
+        """Decode base64 image to RGB numpy array"""
+        image_array = self._imdecode(base64_image, cv2.IMREAD_COLOR)
+        return cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
+
+    def decode_gray(self, base64_image: str) -> np.ndarray:
+        """Decode base64 image to grayscale numpy array"""
+        # Decoded in color and converted like python-face-service does, since
+        # IMREAD_GRAYSCALE takes the JPEG luma plane and gives slightly
+        # different pixels (and so embeddings) for the same image
+        image_array = self._imdecode(base64_image, cv2.IMREAD_COLOR)
+        return cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
 
     def detect_faces(self, image_array: np.ndarray) -> List[Dict[str, Any]]:
-        """Detect faces in image and return face encodings"""
+        """Detect faces in an RGB or grayscale image and return face encodings
+
+        Grayscale input is histogram-equalized in place.
+        """
         try:
             # Convert to grayscale for face detection
-            gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+            if image_array.ndim == 3:
+                gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+            else:
+                gray = image_array
 
             # Apply histogram equalization for better contrast
-            gray = cv2.equalizeHist(gray)
+            cv2.equalizeHist(gray, dst=gray)
+
+            # Downscale large frames for detection, cascade cost grows with area
+            height, width = gray.shape
+            scale = min(
+                1.0,
+                max(
+                    self.min_detection_scale,
+                    self.detection_max_side / max(height, width),
+                ),
+            )
+            if scale < 1.0:
+                detection_gray = cv2.resize(
+                    gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+                )
+            else:
+                detection_gray = gray
 
             # Detect faces using OpenCV with more conservative parameters
-            faces = self.face_cascade.detectMultiScale(
-                gray,
+            faces = self._face_cascade().detectMultiScale(
+                detection_gray,
                 scaleFactor=1.05,  # More conservative scaling
                 minNeighbors=8,  # Higher threshold to reduce false positives
-                minSize=(50, 50),  # Larger minimum size for better quality
-                maxSize=(300, 300),  # Maximum size to avoid false positives
+                minSize=(int(50 * scale), int(50 * scale)),  # Larger minimum size for better quality
+                maxSize=(int(300 * scale), int(300 * scale)),  # Maximum size to avoid false positives
                 flags=cv2.CASCADE_SCALE_IMAGE,
             )
 
             if len(faces) == 0:
                 # No faces detected, but still update tracking state
-                self.previous_faces = []
+                with self._tracking_lock:
+                    self.previous_faces = []
+                    self._prev_boxes = np.empty((0, 4), dtype=np.int32)
                 return []
 
+            # Map boxes back to full-resolution coordinates
+            if scale < 1.0:
+                faces = np.round(faces / scale).astype(int)
+
             detected_faces = []
+            detected_boxes = []
             for i, (x, y, w, h) in enumerate(faces):
                 # Calculate face quality metrics
                 face_region = gray[y : y + h, x : x + w]
@@ -151,9 +264,14 @@ class PythonFaceRecognitionService:
                     "quality_score": quality_score,
                 }
                 detected_faces.append(face_data)
+                detected_boxes.append((x, y, x + w, y + h))
 
             # Apply face tracking to reduce fluctuation
-            tracked_faces = self._track_faces(detected_faces)
+            with self._tracking_lock:
+                tracked_faces = self._track_faces(
+                    detected_faces,
+                    np.array(detected_boxes, dtype=np.int32).reshape(-1, 4),
+                )
 
             # Filter faces by tracking confidence
             stable_faces = []
@@ -171,135 +289,79 @@ class PythonFaceRecognitionService:
             logger.error(f"Error detecting faces: {e}")
             raise Exception(f"Face detection failed: {e}")
 
-    def _create_embedding_from_face(self, face_region: np.ndarray) -> List[float]:
-        """Create a 512-dimensional embedding from face region"""
+    def _create_embedding_from_face(self, face_region: np.ndarray) -> np.ndarray:
+        """Create a 512-dimensional float32 embedding from face region"""
         # Create a more meaningful embedding based on face features
         # This is a simplified approach - in production, use a proper face recognition model
 
         # Resize face to standard size
         face_resized = cv2.resize(face_region, (64, 64))
 
-        # Extract features: histogram, gradients, and texture
-        features = []
+        # Features are written straight into one preallocated 512-dimensional
+        # vector, in the same layout as python-face-service so both services
+        # can be matched against the same faces table
+        embedding = np.zeros(512, dtype=np.float32)
 
         # 1. Histogram features (64 values)
-        hist = cv2.calcHist([face_resized], [0], None, [64], [0, 256])
-        features.extend(hist.flatten() / 255.0)
-
-        # 2. Gradient features (64 values)
-        grad_x = cv2.Sobel(face_resized, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(face_resized, cv2.CV_64F, 0, 1, ksize=3)
-        grad_magnitude = np.sqrt(grad_x**2 + grad_y**2)
+        # 4 gray levels per bin, same binning as calcHist over [0, 256)
+        hist = np.bincount((face_resized >> 2).ravel(), minlength=64)
+        embedding[0:64] = hist / 255.0
+
+        # 2. Gradient features (remaining 448 values)
+        grad_x = cv2.Sobel(face_resized, cv2.CV_32F, 1, 0, ksize=3)
+        grad_y = cv2.Sobel(face_resized, cv2.CV_32F, 0, 1, ksize=3)
+        grad_magnitude = cv2.magnitude(grad_x, grad_y)
         # Normalize gradient magnitude properly
-        grad_normalized = grad_magnitude / (np.max(grad_magnitude) + 1e-8)
-        features.extend(grad_normalized.flatten())
-
-        # 3. Texture features using LBP-like approach (64 values)
-        texture = self._extract_texture_features(face_resized)
-        features.extend(texture)
-
-        # 4. Spatial features (320 values to reach 512)
-        spatial_features = self._extract_spatial_features(face_resized)
-        features.extend(spatial_features)
-
-        # Ensure we have exactly 512 dimensions
-        while len(features) < 512:
-            features.append(0.0)
-
-        # Convert all features to regular Python floats
-        return [float(x) for x in features[:512]]
-
-    def _extract_texture_features(self, face_region: np.ndarray) -> List[float]:
-        """Extract texture features using local binary patterns"""
-        # Simplified LBP implementation
-        features = []
-        for i in range(0, face_region.shape[0], 8):
-            for j in range(0, face_region.shape[1], 8):
-                patch = face_region[i : i + 8, j : j + 8]
-                if patch.shape == (8, 8):
-                    # Calculate local variance as texture measure
-                    variance = np.var(patch)
-                    features.append(float(variance / 255.0))
-        return features[:64]  # Return exactly 64 features
-
-    def _extract_spatial_features(self, face_region: np.ndarray) -> List[float]:
-        """Extract spatial features from face region"""
-        features = []
-
-        # Divide face into regions and extract features
-        h, w = face_region.shape
-        for i in range(4):  # 4x4 grid
-            for j in range(4):
-                y1, y2 = i * h // 4, (i + 1) * h // 4
-                x1, x2 = j * w // 4, (j + 1) * w // 4
-                region = face_region[y1:y2, x1:x2]
-
-                if region.size > 0:
-                    # Mean and std of each region
-                    features.append(float(np.mean(region) / 255.0))
-                    features.append(float(np.std(region) / 255.0))
-
-        # Pad to 320 features
-        while len(features) < 320:
-            features.append(0.0)
-
-        return features[:320]
-
-    def _calculate_iou(self, box1: Dict, box2: Dict) -> float:
-        """Calculate Intersection over Union (IoU) between two face boxes"""
-        # Extract coordinates
-        x1_1, y1_1, w1, h1 = (
-            box1["left"],
-            box1["top"],
-            box1["right"] - box1["left"],
-            box1["bottom"] - box1["top"],
+        grad_magnitude /= grad_magnitude.max() + 1e-8
+        # The 64x64 gradient map alone fills past 512 dimensions, so texture and
+        # spatial features never made it into the truncated embedding
+        embedding[64:512] = grad_magnitude.ravel()[:448]
+
+        return embedding
+
+    def _match_boxes(self, curr_boxes: np.ndarray, prev_boxes: np.ndarray) -> np.ndarray:
+        """Return the best matching previous box index for each current box (-1 if none)"""
+        # Pairwise intersection between every current and previous box
+        xi1 = np.maximum(curr_boxes[:, None, 0], prev_boxes[None, :, 0])
+        yi1 = np.maximum(curr_boxes[:, None, 1], prev_boxes[None, :, 1])
+        xi2 = np.minimum(curr_boxes[:, None, 2], prev_boxes[None, :, 2])
+        yi2 = np.minimum(curr_boxes[:, None, 3], prev_boxes[None, :, 3])
+        intersection = np.clip(xi2 - xi1, 0, None) * np.clip(yi2 - yi1, 0, None)
+
+        # Intersection over Union for all pairs at once
+        curr_area = (curr_boxes[:, 2] - curr_boxes[:, 0]) * (
+            curr_boxes[:, 3] - curr_boxes[:, 1]
         )
-        x1_2, y1_2, w2, h2 = (
-            box2["left"],
-            box2["top"],
-            box2["right"] - box2["left"],
-            box2["bottom"] - box2["top"],
+        prev_area = (prev_boxes[:, 2] - prev_boxes[:, 0]) * (
+            prev_boxes[:, 3] - prev_boxes[:, 1]
         )
+        union = curr_area[:, None] + prev_area[None, :] - intersection
+        iou = np.divide(intersection, union, out=np.zeros(union.shape), where=union > 0)
 
-        # Calculate intersection
-        x2_1, y2_1 = x1_1 + w1, y1_1 + h1
-        x2_2, y2_2 = x1_2 + w2, y1_2 + h2
-
-        xi1 = max(x1_1, x1_2)
-        yi1 = max(y1_1, y1_2)
-        xi2 = min(x2_1, x2_2)
-        yi2 = min(y2_1, y2_2)
-
-        if xi2 <= xi1 or yi2 <= yi1:
-            return 0.0
+        best = iou.argmax(axis=1)
+        best_iou = iou.max(axis=1)
+        return np.where(best_iou > self.face_tracking_threshold, best, -1)
 
-        intersection = (xi2 - xi1) * (yi2 - yi1)
-        union = w1 * h1 + w2 * h2 - intersection
+    def _track_faces(
+        self, current_faces: List[Dict[str, Any]], current_boxes: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """Track faces across frames to reduce fluctuation
 
-        return intersection / union if union > 0 else 0.0
-
-    def _track_faces(self, current_faces: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Track faces across frames to reduce fluctuation"""
+        current_boxes holds the left/top/right/bottom box of each current face.
+        Callers must hold _tracking_lock.
+        """
         if not self.previous_faces:
             # First frame, accept all faces
             tracked_faces = current_faces.copy()
         else:
             tracked_faces = []
 
-            for current_face in current_faces:
-                best_match = None
-                best_iou = 0.0
-
-                # Find best matching previous face
-                for prev_face in self.previous_faces:
-                    iou = self._calculate_iou(
-                        current_face["location"], prev_face["location"]
-                    )
-                    if iou > self.face_tracking_threshold and iou > best_iou:
-                        best_iou = iou
-                        best_match = prev_face
+            # Find best matching previous face for every current face
+            matches = self._match_boxes(current_boxes, self._prev_boxes)
 
-                if best_match:
+            for current_face, match in zip(current_faces, matches):
+                if match >= 0:
+                    best_match = self.previous_faces[match]
                     # Update face with tracking info
                     current_face["track_id"] = best_match.get(
                         "track_id", f"face_{len(tracked_faces)}"
@@ -316,6 +378,7 @@ class PythonFaceRecognitionService:
 
         # Update previous faces for next frame
         self.previous_faces = tracked_faces[: self.max_faces]
+        self._prev_boxes = current_boxes[: self.max_faces]
 
         return tracked_faces
 
@@ -327,11 +390,15 @@ class PythonFaceRecognitionService:
     ) -> Dict[str, Any]:
         """Recognize faces in an image and optionally add new person"""
         try:
-            # Decode image
-            image_array = self.decode_image(image_data)
+            loop = asyncio.get_running_loop()
+
+            # Decode image to grayscale for detection
+            image_array = await loop.run_in_executor(
+                self._pool, self.decode_gray, image_data
+            )
 
             # Detect faces
-            faces = self.detect_faces(image_array)
+            faces = await loop.run_in_executor(self._pool, self.detect_faces, image_array)
             logger.info(f"Face detection completed: {len(faces)} faces detected")
 
             if len(faces) == 0:
@@ -344,9 +411,9 @@ class PythonFaceRecognitionService:
 
             # Use the first detected face
             face = faces[0]
-            face_embedding = face.get("encoding", [])
+            face_embedding = face.get("encoding")
 
-            if not face_embedding:
+            if face_embedding is None or len(face_embedding) == 0:
                 return {
                     "success": False,
                     "person": "Unknown",
@@ -409,133 +476,148 @@ class PythonFaceRecognitionService:
                 "person": "Unknown",
                 "relationship": "Unknown",
                 "message": "Face recognition failed",
-                "error": str(e),
+                **error_fields(e),
             }
 
     def _get_random_color(self) -> str:
         """Get a random hex color for new faces"""
-        import random
-        
-        # Predefined set of nice hex colors for UI display
-        hex_colors = [
-            "#FF6B6B",  # Red
-            "#4ECDC4",  # Teal
-            "#45B7D1",  # Blue
-            "#96CEB4",  # Green
-            "#FFEAA7",  # Yellow
-            "#DDA0DD",  # Plum
-            "#FFB6C1",  # Light Pink
-            "#98D8C8",  # Mint
-            "#F7DC6F",  # Gold
-            "#BB8FCE",  # Lavender
-            "#85C1E9",  # Sky Blue
-            "#F8C471",  # Orange
-        ]
-        
-        return random.choice(hex_colors)
+        return random.choice(HEX_COLORS)
 
     async def process_image(self, image_data: str) -> np.ndarray:
         """Process image and return numpy array"""
         return self.decode_image(image_data)
 
     async def add_face(self, face_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Add a face to the database"""
+        """Add a face to the database, raising if it cannot be reached"""
         try:
             # Convert face_embedding to regular Python floats for JSON serialization
-            if "face_embedding" in face_data and face_data["face_embedding"]:
-                embedding = face_data["face_embedding"]
-                if isinstance(embedding, (list, np.ndarray)):
-                    # Convert numpy float32 to regular Python float
-                    face_data["face_embedding"] = [float(x) for x in embedding]
+            embedding = face_data.get("face_embedding")
+            if isinstance(embedding, (list, np.ndarray)) and len(embedding) > 0:
+                # Convert numpy float32 to regular Python float
+                face_data["face_embedding"] = np.asarray(embedding, dtype=np.float32).tolist()
             
             # Insert face data into Supabase
-            result = supabase.table("faces").insert(face_data).execute()
+            result = get_supabase_client().table("faces").insert(face_data).execute()
 
             if result.data and len(result.data) > 0:
                 logger.info(f"✅ Supabase insert successful: Face ID {result.data[0].get('id', 'unknown')}")
+                # New face must be visible to the next search
+                self._add_to_db_cache(result.data[0], face_data.get("face_embedding"))
                 return result.data[0]
             logger.warning("Supabase insert returned no data")
             return None
 
         except Exception as e:
+            # Re-raised so the caller reports the database as down
             logger.error(f"Error adding face to database: {e}")
-            return None
+            raise
 
     async def get_all_faces(self) -> List[Dict[str, Any]]:
-        """Get all faces from the database"""
+        """Get all faces from the database, raising if it cannot be read"""
         try:
-            result = supabase.table("faces").select("*").execute()
+            result = get_supabase_client().table("faces").select("*").execute()
             return result.data if result.data else []
 
         except Exception as e:
+            # An empty list would be cached as "no known faces"
             logger.error(f"Error getting faces from database: {e}")
-            return []
+            raise
+
+    async def _refresh_db_cache(self) -> None:
+        """Load stored faces and their L2-normalized embeddings into a matrix
+
+        If the database read fails the exception propagates and the previous
+        cache, including its load time, is left untouched.
+        """
+        rows = []
+        vectors = []
+
+        for face in await self.get_all_faces():
+            stored_embedding = face.get("face_embedding")
+            if not stored_embedding:
+                continue
+
+            # Convert string embedding to float list if needed
+            if isinstance(stored_embedding, str):
+                # Parse string representation of array
+                try:
+                    stored_embedding = json.loads(stored_embedding)
+                except:
+                    # If JSON parsing fails, try eval as fallback
+                    try:
+                        stored_embedding = eval(stored_embedding)
+                    except:
+                        logger.warning("Failed to parse stored embedding, skipping face")
+                        continue
+
+            if len(stored_embedding) != self.embedding_dim:
+                logger.warning("Stored embedding has wrong dimension, skipping face")
+                continue
+
+            rows.append(face)
+            vectors.append(stored_embedding)
+
+        matrix = np.array(vectors, dtype=np.float32).reshape(-1, self.embedding_dim)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+
+        self._db_rows = rows
+        self._db_matrix_norm = matrix
+        self._db_loaded_at = time.monotonic()
+
+    def _add_to_db_cache(
+        self, face: Dict[str, Any], embedding: Optional[List[float]]
+    ) -> None:
+        """Append a newly stored face to the cached embedding matrix"""
+        if self._db_rows is None or embedding is None:
+            # Nothing cached yet; the next search loads it from the database
+            return
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.size != self.embedding_dim:
+            return
+        vector = vector / (np.linalg.norm(vector) + 1e-8)
+
+        self._db_rows.append(face)
+        self._db_matrix_norm = np.vstack([self._db_matrix_norm, vector])
 
     async def search_face(
         self, face_embedding: List[float], threshold: float = 0.7
     ) -> Optional[Dict[str, Any]]:
-        """Search for a face in the database using cosine similarity"""
-        try:
-            # Get all faces from database
-            all_faces = await self.get_all_faces()
+        """Search for a face in the database using cosine similarity
+
+        Raises if the stored faces have never been loaded and the database
+        cannot be read, so an outage is not reported as an unknown face.
+        """
+        # Reload cached faces from database when missing or stale
+        if (
+            self._db_rows is None
+            or time.monotonic() - self._db_loaded_at > self.db_cache_ttl
+        ):
+            try:
+                await self._refresh_db_cache()
+            except Exception as e:
+                if self._db_rows is None:
+                    raise
+                logger.warning(f"Face cache refresh failed, searching cached faces: {e}")
 
-            if not all_faces:
+        try:
+            if not self._db_rows:
                 return None
 
-            best_match = None
-            best_similarity = 0.0
-
-            for face in all_faces:
-                if face.get("face_embedding"):
-                    # Convert string embedding to float list if needed
-                    stored_embedding = face["face_embedding"]
-                    if isinstance(stored_embedding, str):
-                        # Parse string representation of array
-                        try:
-                            import json
-                            stored_embedding = json.loads(stored_embedding)
-                        except:
-                            # If JSON parsing fails, try eval as fallback
-                            try:
-                                stored_embedding = eval(stored_embedding)
-                            except:
-                                logger.warning("Failed to parse stored embedding, skipping face")
-                                continue
-                    
-                    # Calculate cosine similarity
-                    similarity = self._cosine_similarity(
-                        face_embedding, stored_embedding
-                    )
-
-                    if similarity > threshold and similarity > best_similarity:
-                        best_similarity = similarity
-                        best_match = face
+            # Cosine similarity against every stored face in one product
+            query = np.asarray(face_embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) + 1e-8)
+            similarities = self._db_matrix_norm @ query
 
-            return best_match
+            best = int(similarities.argmax())
+            if similarities[best] > threshold:
+                return self._db_rows[best]
+            return None
 
         except Exception as e:
             logger.error(f"Error searching face in database: {e}")
             return None
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        try:
-            # Convert to numpy arrays and ensure they are float type
-            vec1 = np.array(vec1, dtype=np.float32)
-            vec2 = np.array(vec2, dtype=np.float32)
-
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-
-            return float(dot_product / (norm1 * norm2))
-        except Exception as e:
-            logger.error(f"Error calculating cosine similarity: {e}")
-            return 0.0
-
 
 from supabase import create_client, Client
 
@@ -543,17 +625,32 @@ from supabase import create_client, Client
 load_dotenv()
 
 
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """Return the Supabase client, created once per process"""
+    url: str = os.environ.get("SUPABASE_URL")
+    key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    return create_client(url, key)
+
+
+# match_faces parameters for the startup vector probe, built once
+MATCH_FACES_PROBE_PARAMS = {
+    "query_embedding": [0.0] * 512,  # Dummy vector
+    "match_threshold": 0.1,
+    "match_count": 1,
+}
 
-supabase: Client = create_client(url, key)
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize face recognition service
-python_face_recognition_service = PythonFaceRecognitionService()
+
+@lru_cache(maxsize=1)
+def get_face_service() -> PythonFaceRecognitionService:
+    """Return the face recognition service, created once per process"""
+    return PythonFaceRecognitionService()
+
 
 # Server initialization - creates core MCP server instance
 server = Server("dementia-aid-mcp-server")
@@ -646,9 +743,22 @@ list_tools_tool = Tool(
     },
 )
 
+TOOL_LIST = [
+    ping_tool,
+    face_recognition_tool,
+    timer_tool,
+    location_tool,
+    list_tools_tool,
+]
+
 # Tool handlers - contains the logic for each tool
 
 
+def to_json(data: Any) -> str:
+    """Serialize a tool response, including numpy scalars, to JSON text"""
+    return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
 async def handle_ping(args: Dict[str, Any]) -> CallToolResult:
     """Handle ping tool requests"""
     message = args.get("message", "Hello from MCP!")
@@ -657,12 +767,12 @@ async def handle_ping(args: Dict[str, Any]) -> CallToolResult:
     response_data = {
         "success": True,
         "echo": message,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),  # orjson writes the ISO string natively
         "server": "dementia-aid-mcp-server",
     }
 
     return CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(response_data))]
+        content=[TextContent(type="text", text=to_json(response_data))]
     )
 
 
@@ -678,12 +788,12 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
 
     try:
         # Use the unified recognize_face method
-        recognition_result = await python_face_recognition_service.recognize_face(
+        recognition_result = await get_face_service().recognize_face(
             image_data, person_name, person_relationship
         )
 
         return CallToolResult(
-            content=[TextContent(type="text", text=json.dumps(recognition_result))]
+            content=[TextContent(type="text", text=to_json(recognition_result))]
         )
 
     except Exception as error:
@@ -693,10 +803,10 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
             "person": "Unknown",
             "relationship": "Unknown",
             "message": "Face recognition failed",
-            "error": str(error),
+            **error_fields(error),
         }
         return CallToolResult(
-            content=[TextContent(type="text", text=json.dumps(error_response))]
+            content=[TextContent(type="text", text=to_json(error_response))]
         )
 
 
@@ -707,12 +817,12 @@ async def handle_timer(args: Dict[str, Any]) -> CallToolResult:
     response_data = {
         "success": True,
         "message": "Timer processing...",
-        "timer_id": f"timer_{int(datetime.now().timestamp() * 1000)}",
+        "timer_id": f"timer_{time.time_ns() // 1_000_000}",
         "duration": args.get("duration_minutes", 30),
     }
 
     return CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(response_data))]
+        content=[TextContent(type="text", text=to_json(response_data))]
     )
 
 
@@ -728,18 +838,13 @@ async def handle_location(args: Dict[str, Any]) -> CallToolResult:
     }
 
     return CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(response_data))]
+        content=[TextContent(type="text", text=to_json(response_data))]
     )
 
 
-async def handle_list_tools_info(args: Dict[str, Any]) -> CallToolResult:
-    """Handle list tools info requests"""
-    logger.info("Tools list info requested")
-
-    # Define the base Modal URL (you might want to make this configurable)
-    modal_base_url = ""
-
-    tools_info = [
+def build_tools_info(modal_base_url: str) -> List[Dict[str, Any]]:
+    """Describe every tool with its arguments and Modal endpoint URL"""
+    return [
         {
             "name": "ping",
             "description": "Simple ping tool to test MCP connection",
@@ -819,19 +924,30 @@ async def handle_list_tools_info(args: Dict[str, Any]) -> CallToolResult:
         },
     ]
 
-    response_data = {
-        "success": True,
-        "tools": tools_info,
-        "total_tools": len(tools_info),
-        "server": "dementia-aid-mcp-server",
-        "timestamp": datetime.now().isoformat(),
-        "health_check_endpoint": f"{modal_base_url}health.modal.run",
-    }
 
-    return CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(response_data, indent=2))]
+# Static tool descriptions served by list_tools
+TOOLS_INFO = build_tools_info("")
+
+# Static list_tools_info response, only the timestamp changes per request
+TOOLS_INFO_RESPONSE = {
+    "success": True,
+    "tools": TOOLS_INFO,
+    "total_tools": len(TOOLS_INFO),
+    "server": "dementia-aid-mcp-server",
+    "health_check_endpoint": "health.modal.run",
+}
+
+
+async def handle_list_tools_info(args: Dict[str, Any]) -> CallToolResult:
+    """Handle list tools info requests"""
+    logger.info("Tools list info requested")
+
+    response_text = to_json(
+        {**TOOLS_INFO_RESPONSE, "timestamp": datetime.now().isoformat()}
     )
 
+    return CallToolResult(content=[TextContent(type="text", text=response_text)])
+
 
 # Request handlers - handles the requests from the client
 
@@ -840,13 +956,7 @@ async def handle_list_tools_info(args: Dict[str, Any]) -> CallToolResult:
 async def handle_list_tools() -> List[Tool]:
     """Handle list tools requests"""
     logger.info("Tools list requested")
-    return [
-        ping_tool,
-        face_recognition_tool,
-        timer_tool,
-        location_tool,
-        list_tools_tool,
-    ]
+    return TOOL_LIST
 
 
 @server.call_tool()
@@ -877,6 +987,10 @@ async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> CallToolResu
         raise McpError(ErrorCode.INTERNAL_ERROR, f"Tool {name} failed: {str(error)}")
 
 
+# Initialization options are static once the handlers above are registered
+INIT_OPTIONS = server.create_initialization_options()
+
+
 # Server startup - starts the server and connects to the client
 
 # Modal app configuration
@@ -890,63 +1004,71 @@ image = (
             "mcp",
             "supabase",
             "python-dotenv",
-            "opencv-python-headless",
-            "Pillow",
-            "numpy",
+            "opencv-python-headless>=4.9",
+            "numpy>=1.26",
+            "orjson",
             "fastapi",
             "uvicorn",
         ]
     )
     .apt_install(["libgl1-mesa-glx", "libglib2.0-0"])
+    # Detection already runs on a thread pool; keep BLAS single-threaded per call
+    .env({"OPENBLAS_NUM_THREADS": "1"})
 )
 
 
-@app.function(
+@app.cls(
     image=image,
     secrets=[modal.Secret.from_name("supabase-credentials")],
     keep_warm=1,
 )
-@modal.web_endpoint(method="POST", label="mcp-face-recognition")
-async def face_recognition_endpoint(item: dict):
-    """Modal web endpoint for face recognition"""
-    try:
-        logger.info(f"Face recognition API called: {item}")
+class FaceRecognitionEndpoint:
+    """Face recognition endpoint with the service loaded at container start"""
 
-        # Initialize services if needed
-        global python_face_recognition_service, supabase
-        if not python_face_recognition_service:
-            python_face_recognition_service = PythonFaceRecognitionService()
+    @modal.enter()
+    async def load(self):
+        """Build the service and fill its embedding cache before the first request"""
+        self.service = get_face_service()
+        try:
+            await self.service._refresh_db_cache()
+        except Exception as e:
+            logger.warning(f"Face cache preload failed, loading on first search: {e}")
 
-        image_data = item.get("image_data")
-        person_name = item.get("person_name")
-        person_relationship = item.get("person_relationship")
+    @modal.web_endpoint(method="POST", label="mcp-face-recognition")
+    async def face_recognition_endpoint(self, item: dict):
+        """Modal web endpoint for face recognition"""
+        try:
+            logger.info(f"Face recognition API called: {item}")
 
-        if not image_data:
-            return {
-                "success": False,
-                "message": "image_data is required",
-                "error": "Missing image_data parameter",
-            }
+            image_data = item.get("image_data")
+            person_name = item.get("person_name")
+            person_relationship = item.get("person_relationship")
 
-        result = await python_face_recognition_service.recognize_face(
-            image_data, person_name, person_relationship
-        )
+            if not image_data:
+                return {
+                    "success": False,
+                    "message": "image_data is required",
+                    "code": int(ErrCode.MISSING_IMAGE),
+                    "error": ErrCode.MISSING_IMAGE.name,
+                }
 
-        return result
+            result = await self.service.recognize_face(
+                image_data, person_name, person_relationship
+            )
 
-    except Exception as e:
-        logger.error(f"Face recognition API error: {e}")
-        return {"success": False, "message": "Face recognition failed", "error": str(e)}
+            return result
 
+        except Exception as e:
+            logger.error(f"Face recognition API error: {e}")
+            return {
+                "success": False,
+                "message": "Face recognition failed",
+                **error_fields(e),
+            }
 
-@app.function(
-    image=image,
-    secrets=[modal.Secret.from_name("supabase-credentials")],
-    keep_warm=1,
-)
-@modal.web_endpoint(method="POST", label="mcp-ping")
-async def ping_endpoint(item: dict):
-    """Modal web endpoint for ping"""
+
+async def ping_response(item: dict) -> dict:
+    """Build the ping endpoint response"""
     try:
         message = item.get("message", "Hello from MCP!")
 
@@ -961,24 +1083,18 @@ async def ping_endpoint(item: dict):
 
     except Exception as e:
         logger.error(f"Ping API error: {e}")
-        return {"success": False, "message": "Ping failed", "error": str(e)}
+        return {"success": False, "message": "Ping failed", **error_fields(e)}
 
 
-@app.function(
-    image=image,
-    secrets=[modal.Secret.from_name("supabase-credentials")],
-    keep_warm=1,
-)
-@modal.web_endpoint(method="POST", label="mcp-timer")
-async def timer_endpoint(item: dict):
-    """Modal web endpoint for timer management"""
+async def timer_response(item: dict) -> dict:
+    """Build the timer management endpoint response"""
     try:
         logger.info("Timer management API called")
 
         response_data = {
             "success": True,
             "message": "Timer processing...",
-            "timer_id": f"timer_{int(datetime.now().timestamp() * 1000)}",
+            "timer_id": f"timer_{time.time_ns() // 1_000_000}",
             "duration": item.get("duration_minutes", 30),
         }
 
@@ -986,17 +1102,11 @@ async def timer_endpoint(item: dict):
 
     except Exception as e:
         logger.error(f"Timer API error: {e}")
-        return {"success": False, "message": "Timer failed", "error": str(e)}
+        return {"success": False, "message": "Timer failed", **error_fields(e)}
 
 
-@app.function(
-    image=image,
-    secrets=[modal.Secret.from_name("supabase-credentials")],
-    keep_warm=1,
-)
-@modal.web_endpoint(method="POST", label="mcp-location")
-async def location_endpoint(item: dict):
-    """Modal web endpoint for location monitoring"""
+async def location_response(item: dict) -> dict:
+    """Build the location monitoring endpoint response"""
     try:
         logger.info("Location monitoring API called")
 
@@ -1014,132 +1124,70 @@ async def location_endpoint(item: dict):
         return {
             "success": False,
             "message": "Location monitoring failed",
-            "error": str(e),
+            **error_fields(e),
         }
 
 
-@app.function(
-    image=image,
-    secrets=[modal.Secret.from_name("supabase-credentials")],
-    keep_warm=1,
-)
-@modal.web_endpoint(method="GET", label="mcp-list-tools")
-async def list_tools_endpoint():
-    """Modal web endpoint for listing all tools"""
-    try:
-        logger.info("List tools API called")
+# Base URL of the deployed Modal endpoints
+MODAL_BASE_URL = "https://antoinedoyen--dementia-aid-mcp-server-mcp-"
 
-        # Define the base Modal URL (you might want to make this configurable)
-        modal_base_url = "https://antoinedoyen--dementia-aid-mcp-server-mcp-"
-
-        tools_info = [
-            {
-                "name": "ping",
-                "description": "Simple ping tool to test MCP connection",
-                "modal_endpoint": f"{modal_base_url}ping.modal.run",
-                "method": "POST",
-                "arguments": {
-                    "message": {
-                        "type": "string",
-                        "description": "Message to echo back",
-                        "required": False,
-                        "default": "Hello from MCP!",
-                    }
-                },
-            },
-            {
-                "name": "recognize_face",
-                "description": "Identify a person from camera input using facial recognition. If person not found and name/relationship provided, adds new person to database.",
-                "modal_endpoint": f"{modal_base_url}face-recognition.modal.run",
-                "method": "POST",
-                "arguments": {
-                    "image_data": {
-                        "type": "string",
-                        "description": "Base64 encoded image data",
-                        "required": True,
-                    },
-                    "person_name": {
-                        "type": "string",
-                        "description": "Name of the person (optional - if provided, will be used for new person creation)",
-                        "required": False,
-                    },
-                    "person_relationship": {
-                        "type": "string",
-                        "description": "Relationship to the person (optional - if provided, will be used for new person creation)",
-                        "required": False,
-                    },
-                },
-            },
-            {
-                "name": "manage_timer",
-                "description": "Timer management for time-sensitive events",
-                "modal_endpoint": f"{modal_base_url}timer.modal.run",
-                "method": "POST",
-                "arguments": {
-                    "action": {
-                        "type": "string",
-                        "enum": ["set"],
-                        "description": "Timer action",
-                        "required": True,
-                    },
-                    "duration_minutes": {
-                        "type": "number",
-                        "description": "Duration in minutes",
-                        "required": False,
-                    },
-                },
-            },
-            {
-                "name": "monitor_location",
-                "description": "Location monitoring and safety checks",
-                "modal_endpoint": f"{modal_base_url}location.modal.run",
-                "method": "POST",
-                "arguments": {
-                    "action": {
-                        "type": "string",
-                        "enum": ["check_safety"],
-                        "description": "Location action",
-                        "required": True,
-                    }
-                },
-            },
-            {
-                "name": "list_tools",
-                "description": "List all available tools with their descriptions, arguments, and Modal endpoint URLs",
-                "modal_endpoint": f"{modal_base_url}list-tools.modal.run",
-                "method": "GET",
-                "arguments": {},
-            },
-        ]
+# Tool descriptions with the deployed Modal endpoint URLs, built once
+MODAL_TOOLS_INFO = build_tools_info(MODAL_BASE_URL)
 
-        response_data = {
-            "success": True,
-            "tools": tools_info,
-            "total_tools": len(tools_info),
-            "server": "dementia-aid-mcp-server",
-            "timestamp": datetime.now().isoformat(),
-            "health_check_endpoint": f"{modal_base_url}health.modal.run",
-        }
+# Static list_tools endpoint response, only the timestamp changes per request
+LIST_TOOLS_RESPONSE = {
+    "success": True,
+    "tools": MODAL_TOOLS_INFO,
+    "total_tools": len(MODAL_TOOLS_INFO),
+    "server": "dementia-aid-mcp-server",
+    "health_check_endpoint": f"{MODAL_BASE_URL}health.modal.run",
+    "dispatch_endpoint": f"{MODAL_BASE_URL}dispatch.modal.run",
+}
 
-        return response_data
+
+async def list_tools_response() -> dict:
+    """Build the list tools endpoint response"""
+    try:
+        logger.info("List tools API called")
+
+        return {**LIST_TOOLS_RESPONSE, "timestamp": datetime.now().isoformat()}
 
     except Exception as e:
         logger.error(f"List tools API error: {e}")
-        return {"success": False, "message": "List tools failed", "error": str(e)}
+        return {"success": False, "message": "List tools failed", **error_fields(e)}
+
+
+# Database status is reused for a few seconds so frequent health polls
+# do not each cost a Supabase round-trip
+HEALTH_CACHE_TTL = 5.0
+_health_cache: Dict[str, Any] = {"ts": 0.0, "database": None}
+_health_lock = asyncio.Lock()
+
+
+async def get_db_status() -> str:
+    """Return the cached database status, re-probing Supabase once the TTL expires"""
+    async with _health_lock:
+        now = time.monotonic()
+        if (
+            _health_cache["database"] is None
+            or now - _health_cache["ts"] >= HEALTH_CACHE_TTL
+        ):
+            supabase = get_supabase_client()
+            response = await asyncio.to_thread(
+                lambda: supabase.table("faces").select("count").limit(1).execute()
+            )
+            _health_cache["database"] = (
+                "connected" if response.data is not None else "disconnected"
+            )
+            _health_cache["ts"] = now
+        return _health_cache["database"]
 
 
-@app.function(
-    image=image,
-    secrets=[modal.Secret.from_name("supabase-credentials")],
-    keep_warm=1,
-)
-@modal.web_endpoint(method="GET", label="mcp-health")
-async def health_endpoint():
-    """Modal web endpoint for health check"""
+async def health_response() -> dict:
+    """Build the health check endpoint response"""
     try:
-        # Test Supabase connection
-        response = supabase.table("faces").select("count").limit(1).execute()
-        db_status = "connected" if response.data is not None else "disconnected"
+        # Test Supabase connection (cached for HEALTH_CACHE_TTL seconds)
+        db_status = await get_db_status()
 
         return {
             "status": "healthy",
@@ -1155,10 +1203,89 @@ async def health_endpoint():
             "status": "unhealthy",
             "timestamp": datetime.now().isoformat(),
             "server": "dementia-aid-mcp-server",
-            "error": str(e),
+            **error_fields(e),
         }
 
 
+# The lightweight tools share one warm container behind the dispatch endpoint;
+# their per-tool endpoints below forward to the same functions and scale from zero
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("supabase-credentials")],
+    keep_warm=1,
+)
+@modal.web_endpoint(method="POST", label="mcp-dispatch")
+async def dispatch_endpoint(item: dict):
+    """Modal web endpoint routing lightweight tool calls by item["tool"]"""
+    tool = item.get("tool")
+
+    if tool == "ping":
+        return await ping_response(item)
+    elif tool == "manage_timer":
+        return await timer_response(item)
+    elif tool == "monitor_location":
+        return await location_response(item)
+    elif tool == "list_tools":
+        return await list_tools_response()
+    elif tool == "health":
+        return await health_response()
+    else:
+        return {
+            "success": False,
+            "message": f"Unknown tool: {tool}. Supported tools: ping, manage_timer, monitor_location, list_tools, health",
+        }
+
+
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("supabase-credentials")],
+)
+@modal.web_endpoint(method="POST", label="mcp-ping")
+async def ping_endpoint(item: dict):
+    """Modal web endpoint for ping"""
+    return await ping_response(item)
+
+
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("supabase-credentials")],
+)
+@modal.web_endpoint(method="POST", label="mcp-timer")
+async def timer_endpoint(item: dict):
+    """Modal web endpoint for timer management"""
+    return await timer_response(item)
+
+
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("supabase-credentials")],
+)
+@modal.web_endpoint(method="POST", label="mcp-location")
+async def location_endpoint(item: dict):
+    """Modal web endpoint for location monitoring"""
+    return await location_response(item)
+
+
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("supabase-credentials")],
+)
+@modal.web_endpoint(method="GET", label="mcp-list-tools")
+async def list_tools_endpoint():
+    """Modal web endpoint for listing all tools"""
+    return await list_tools_response()
+
+
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("supabase-credentials")],
+)
+@modal.web_endpoint(method="GET", label="mcp-health")
+async def health_endpoint():
+    """Modal web endpoint for health check"""
+    return await health_response()
+
+
 @app.function(
     image=image,
     secrets=[modal.Secret.from_name("supabase-credentials")],
@@ -1182,8 +1309,33 @@ async def main():
         # Test Supabase connection
         logger.info("Testing Supabase connection...")
         try:
+            supabase = get_supabase_client()
+
+            async def _probe_basic():
+                return await asyncio.to_thread(
+                    lambda: supabase.table("faces").select("count").limit(1).execute()
+                )
+
+            async def _probe_table():
+                return await asyncio.to_thread(
+                    lambda: supabase.table("faces").select("id").limit(1).execute()
+                )
+
+            async def _probe_vector():
+                return await asyncio.to_thread(
+                    lambda: supabase.rpc(
+                        "match_faces", MATCH_FACES_PROBE_PARAMS
+                    ).execute()
+                )
+
+            # Run the three probes concurrently so startup waits for one round-trip
+            response, table_test, vector_test = await asyncio.gather(
+                _probe_basic(), _probe_table(), _probe_vector(), return_exceptions=True
+            )
+
             # Test basic connection
-            response = supabase.table("faces").select("count").limit(1).execute()
+            if isinstance(response, Exception):
+                raise response
             if response.data is None:
                 logger.warning("Supabase connection warning")
                 logger.warning(
@@ -1193,7 +1345,8 @@ async def main():
                 logger.info("✅ Supabase connection successful")
 
             # Test if faces table exists and is accessible
-            table_test = supabase.table("faces").select("id").limit(1).execute()
+            if isinstance(table_test, Exception):
+                raise table_test
             if table_test.data is None:
                 logger.warning("⚠️  Faces table issue")
                 logger.warning("You may need to run the database schema setup")
@@ -1201,27 +1354,14 @@ async def main():
                 logger.info("✅ Faces table accessible")
 
             # Test vector extension (if available)
-            try:
-                dummy_vector = [0.0] * 512  # Dummy vector
-                vector_test = supabase.rpc(
-                    "match_faces",
-                    {
-                        "query_embedding": dummy_vector,
-                        "match_threshold": 0.1,
-                        "match_count": 1,
-                    },
-                ).execute()
-
-                if vector_test.data is None:
-                    logger.warning("⚠️  Vector functions issue")
-                    logger.warning(
-                        "You may need to run the supabase-functions.sql setup"
-                    )
-                else:
-                    logger.info("✅ Vector functions accessible")
-            except Exception as vector_error:
-                logger.warning(f"⚠️  Vector functions issue: {vector_error}")
+            if isinstance(vector_test, Exception):
+                logger.warning(f"⚠️  Vector functions issue: {vector_test}")
                 logger.warning("You may need to run the supabase-functions.sql setup")
+            elif vector_test.data is None:
+                logger.warning("⚠️  Vector functions issue")
+                logger.warning("You may need to run the supabase-functions.sql setup")
+            else:
+                logger.info("✅ Vector functions accessible")
 
         except Exception as connection_error:
             logger.error(f"❌ Supabase connection failed: {connection_error}")
@@ -1230,9 +1370,7 @@ async def main():
         # Start the server
         try:
             async with stdio_server() as (read_stream, write_stream):
-                await server.run(
-                    read_stream, write_stream, server.create_initialization_options()
-                )
+                await server.run(read_stream, write_stream, INIT_OPTIONS)
         except Exception as server_error:
             logger.error(f"Server runtime error: {server_error}")
             import traceback
@@ -1269,10 +1407,11 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
-# Register signal handlers
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
-
 # Start server if this is the main module
 if __name__ == "__main__":
+    # Register signal handlers for local stdio runs; Modal manages worker shutdown
+    if not os.environ.get("MODAL_TASK_ID"):
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
     asyncio.run(main())
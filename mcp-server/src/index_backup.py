@@ -6,21 +6,19 @@ Python translation of the MCP server for dementia aid tools
 
 import asyncio
 import base64
-import io
-import json
 import logging
 import os
 import signal
 import sys
+import time
 from datetime import datetime
+from enum import IntEnum
 from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
-import cv2
-import numpy as np
-from PIL import Image
+import orjson
 
 from mcp import ClientSession, StdioServerParameters
-from mcp.server import Server
+from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
 from mcp.types import (
@@ -33,10 +31,45 @@ from mcp.types import (
 )
 
 
+class ErrCode(IntEnum):
+    """Error codes returned in the "code" field of failed responses"""
+
+    OK = 0
+    MISSING_IMAGE = 1
+    DB_DOWN = 2
+    INVALID_IMAGE = 3
+    UNKNOWN = 99
+
+
+# Top-level packages whose exceptions mean the database could not be reached;
+# PostgREST errors (bad payloads, constraint violations) are not outages
+DB_ERROR_MODULES = ("httpx", "httpcore")
+
+
+def error_fields(error: Exception) -> Dict[str, Any]:
+    """Classify an exception into response fields without formatting its message"""
+    if type(error).__module__.partition(".")[0] in DB_ERROR_MODULES:
+        code = ErrCode.DB_DOWN
+    else:
+        code = ErrCode.UNKNOWN
+    return {"code": int(code), "error": code.name}
+
+
 class python_face_recognition_service:
     async def recognize_face(*args):
         pass
 
+    async def get_all_faces(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get one page of faces, without transferring the embedding column"""
+        result = await asyncio.to_thread(
+            lambda: supabase.table("faces")
+            .select(LIST_FACES_COLUMNS)
+            .order("created_at")
+            .range(offset, offset + limit - 1)
+            .execute()
+        )
+        return result.data if result.data else []
+
 
 from supabase import create_client, Client
 
@@ -49,6 +82,12 @@ key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 
 supabase: Client = create_client(url, key)
 
+# Columns returned by list_faces; face_embedding is never sent to the client
+LIST_FACES_COLUMNS = "id,name,relationship,color,created_at"
+
+# Largest page list_faces returns; bigger limits are clamped to it
+LIST_FACES_MAX_LIMIT = 200
+
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -108,6 +147,17 @@ face_recognition_tool = Tool(
                 "type": "string",
                 "description": "UI color for the person (optional, defaults to blue)",
             },
+            "limit": {
+                "type": "integer",
+                "minimum": 1,
+                "maximum": LIST_FACES_MAX_LIMIT,
+                "description": f"Maximum number of faces to return for list_faces (defaults to 50, at most {LIST_FACES_MAX_LIMIT})",
+            },
+            "offset": {
+                "type": "integer",
+                "minimum": 0,
+                "description": "Number of faces to skip for list_faces (defaults to 0)",
+            },
         },
         "required": ["image_data", "operation"],
     },
@@ -152,6 +202,11 @@ location_tool = Tool(
 # Tool handlers - contains the logic for each tool
 
 
+def to_json(data: Any) -> str:
+    """Serialize a tool response to JSON text (datetimes become ISO 8601)"""
+    return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
 async def handle_ping(args: Dict[str, Any]) -> CallToolResult:
     """Handle ping tool requests"""
     message = args.get("message", "Hello from MCP!")
@@ -160,12 +215,12 @@ async def handle_ping(args: Dict[str, Any]) -> CallToolResult:
     response_data = {
         "success": True,
         "echo": message,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),
         "server": "dementia-aid-mcp-server",
     }
 
     return CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(response_data))]
+        content=[TextContent(type="text", text=to_json(response_data))]
     )
 
 
@@ -185,7 +240,7 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
                 image_data
             )
             return CallToolResult(
-                content=[TextContent(type="text", text=json.dumps(recognition_result))]
+                content=[TextContent(type="text", text=to_json(recognition_result))]
             )
 
         elif operation == "add_face":
@@ -195,7 +250,7 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
                     "message": "Name and relationship are required for add_face operation",
                 }
                 return CallToolResult(
-                    content=[TextContent(type="text", text=json.dumps(error_response))]
+                    content=[TextContent(type="text", text=to_json(error_response))]
                 )
 
             # Process image to get embedding
@@ -212,7 +267,7 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
                     "message": "No face detected in the image. Please provide a clear image with a face.",
                 }
                 return CallToolResult(
-                    content=[TextContent(type="text", text=json.dumps(error_response))]
+                    content=[TextContent(type="text", text=to_json(error_response))]
                 )
 
             # Add the first detected face to database
@@ -237,7 +292,7 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
                 }
                 return CallToolResult(
                     content=[
-                        TextContent(type="text", text=json.dumps(success_response))
+                        TextContent(type="text", text=to_json(success_response))
                     ]
                 )
             else:
@@ -246,27 +301,37 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
                     "message": "Failed to add face to database",
                 }
                 return CallToolResult(
-                    content=[TextContent(type="text", text=json.dumps(error_response))]
+                    content=[TextContent(type="text", text=to_json(error_response))]
                 )
 
         elif operation == "list_faces":
-            all_faces = await python_face_recognition_service.get_all_faces()
+            limit = args.get("limit", 50)
+            offset = args.get("offset", 0)
+            # null, strings, floats and booleans are rejected rather than coerced
+            if type(limit) is not int or type(offset) is not int or offset < 0:
+                error_response = {
+                    "success": False,
+                    "message": "limit must be an integer and offset a non-negative integer for list_faces",
+                }
+                return CallToolResult(
+                    content=[TextContent(type="text", text=to_json(error_response))]
+                )
+
+            # Keep pages between 1 and LIST_FACES_MAX_LIMIT rows
+            limit = min(max(limit, 1), LIST_FACES_MAX_LIMIT)
+            all_faces = await python_face_recognition_service.get_all_faces(
+                limit, offset
+            )
+            # Rows already carry only LIST_FACES_COLUMNS, so they are sent as-is
             response_data = {
                 "success": True,
                 "message": f"Found {len(all_faces)} known faces",
-                "faces": [
-                    {
-                        "id": face["id"],
-                        "name": face["name"],
-                        "relationship": face["relationship"],
-                        "color": face["color"],
-                        "created_at": face["created_at"],
-                    }
-                    for face in all_faces
-                ],
+                "faces": all_faces,
+                "limit": limit,
+                "offset": offset,
             }
             return CallToolResult(
-                content=[TextContent(type="text", text=json.dumps(response_data))]
+                content=[TextContent(type="text", text=to_json(response_data))]
             )
 
         else:
@@ -275,7 +340,7 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
                 "message": f"Unknown operation: {operation}. Supported operations: identify, add_face, list_faces",
             }
             return CallToolResult(
-                content=[TextContent(type="text", text=json.dumps(error_response))]
+                content=[TextContent(type="text", text=to_json(error_response))]
             )
 
     except Exception as error:
@@ -283,10 +348,10 @@ async def handle_face_recognition(args: Dict[str, Any]) -> CallToolResult:
         error_response = {
             "success": False,
             "message": "Face recognition failed",
-            "error": str(error),
+            **error_fields(error),
         }
         return CallToolResult(
-            content=[TextContent(type="text", text=json.dumps(error_response))]
+            content=[TextContent(type="text", text=to_json(error_response))]
         )
 
 
@@ -297,12 +362,12 @@ async def handle_timer(args: Dict[str, Any]) -> CallToolResult:
     response_data = {
         "success": True,
         "message": "Timer processing...",
-        "timer_id": f"timer_{int(datetime.now().timestamp() * 1000)}",
+        "timer_id": f"timer_{time.time_ns() // 1_000_000}",
         "duration": args.get("duration_minutes", 30),
     }
 
     return CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(response_data))]
+        content=[TextContent(type="text", text=to_json(response_data))]
     )
 
 
@@ -318,7 +383,7 @@ async def handle_location(args: Dict[str, Any]) -> CallToolResult:
     }
 
     return CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(response_data))]
+        content=[TextContent(type="text", text=to_json(response_data))]
     )
 
 
@@ -354,6 +419,17 @@ async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> CallToolResu
         raise McpError(ErrorCode.INTERNAL_ERROR, f"Tool {name} failed: {str(error)}")
 
 
+# Initialization options are static once the handlers above are registered
+INIT_OPTIONS = InitializationOptions(
+    server_name="dementia-aid-mcp-server",
+    server_version="1.0.0",
+    capabilities=server.get_capabilities(
+        notification_options=NotificationOptions(),
+        experimental_capabilities=None,
+    ),
+)
+
+
 # Server startup - starts the server and connects to the client
 
 
@@ -417,18 +493,7 @@ async def main():
 
         # Start the server
         async with stdio_server() as (read_stream, write_stream):
-            await server.run(
-                read_stream,
-                write_stream,
-                InitializationOptions(
-                    server_name="dementia-aid-mcp-server",
-                    server_version="1.0.0",
-                    capabilities=server.get_capabilities(
-                        notification_options=None,
-                        experimental_capabilities=None,
-                    ),
-                ),
-            )
+            await server.run(read_stream, write_stream, INIT_OPTIONS)
 
         logger.info("MCP Server connected and ready!")
         logger.info("Available tools:")
@@ -456,10 +521,11 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
-# Register signal handlers
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
-
 # Start server if this is the main module
 if __name__ == "__main__":
+    # Register signal handlers for local stdio runs; Modal manages worker shutdown
+    if not os.environ.get("MODAL_TASK_ID"):
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
     asyncio.run(main())
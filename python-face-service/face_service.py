@@ -5,18 +5,23 @@ Provides face detection and recognition capabilities for the MCP server
 Uses OpenCV for face detection (simpler than face_recognition)
 """
 
+import asyncio
 import base64
-import io
 import json
 import logging
-import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from PIL import Image
 import cv2
 import numpy as np
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import uvicorn
+import xxhash
 
 # Configure logging with more detailed output
 logging.basicConfig(
@@ -25,17 +30,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# uvicorn worker processes; every worker imports this module, so each one sizes
+# its OpenCV thread pool from its share of the CPUs
+RELOAD = os.getenv("RELOAD", "false").lower() == "true"  # Development only, single process
+WORKERS = 1 if RELOAD else int(os.getenv("WORKERS", os.cpu_count() or 1))
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Face Recognition Service",
     description="Facial recognition microservice for MCP server",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # Float-heavy encoding lists serialize much faster with orjson
 )
 
 # Pydantic models for request/response
 class FaceDetectionRequest(BaseModel):
     image_data: str  # Base64 encoded image
     operation: str   # "detect", "recognize", "add_face"
+    encoding_format: str = "list"  # "list" (JSON floats) or "float16" (base64-encoded)
 
 class FaceDetectionResponse(BaseModel):
     success: bool
@@ -51,22 +63,60 @@ class FaceService:
     """Main face recognition service class"""
     
     def __init__(self):
-        # Load OpenCV face cascade classifier
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Make sure OpenCV uses its SIMD code paths, with this worker's share of
+        # the CPUs (a single thread when several workers split them)
+        cv2.setUseOptimized(True)
+        cv2.setNumThreads(max(1, (os.cpu_count() or 1) // WORKERS))
+        
+        # Decoding and detection run off the event loop on a small dedicated
+        # pool; OpenCV releases the GIL, but more concurrent detections than
+        # this would only oversubscribe the CPUs
+        self.detection_threads = 2
+        self._pool = ThreadPoolExecutor(max_workers=self.detection_threads, thread_name_prefix="face-detect")
+        
+        # Requests run detection on worker threads; each thread loads its own
+        # cascade classifier, which is not safe to share between threads
+        self._local = threading.local()
         
-        # Face tracking state
+        # Face tracking state (guarded by _state_lock, like the embedding cache)
+        self._state_lock = threading.Lock()
         self.previous_faces = []
+        self._prev_boxes = np.empty((0, 4), dtype=np.int32)  # left/top/right/bottom of previous_faces
         self.face_tracking_threshold = 0.3  # IoU threshold for face tracking
         self.min_face_confidence = 0.6      # Minimum confidence for face acceptance
         self.max_faces = 5                  # Maximum number of faces to track
+        self.detection_max_side = 640       # Longest side of the frame used for detection
+        self.min_detection_scale = 24 / 50  # Never shrink below the cascade's 24px window for a 50px face
         
         # Face detection only - database operations handled by MCP server
         self.similarity_threshold = 0.7  # Threshold for person matching
         
+        # Embeddings are a pure function of the face pixels, so repeated regions
+        # (e.g. the same frame sent again) reuse them from a bounded LRU cache
+        self._embedding_cache = OrderedDict()
+        self.embedding_cache_size = 1024
+        
         logger.info("Face detection service initialized with OpenCV and face tracking")
     
+    def _face_cascade(self) -> cv2.CascadeClassifier:
+        """Return the face cascade classifier owned by the calling thread"""
+        face_cascade = getattr(self._local, 'face_cascade', None)
+        if face_cascade is None:
+            # Load OpenCV face cascade classifier
+            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self._local.face_cascade = face_cascade
+        return face_cascade
+    
+    def _buffer(self, name: str, shape: tuple) -> np.ndarray:
+        """Return a per-thread uint8 scratch array, reallocated only when the shape changes"""
+        buffer = getattr(self._local, name, None)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            setattr(self._local, name, buffer)
+        return buffer
+    
     def decode_image(self, base64_image: str) -> np.ndarray:
-        """Decode base64 image to numpy array"""
+        """Decode base64 image to a BGR numpy array"""
         try:
             # Remove data URL prefix if present
             if ',' in base64_image:
@@ -75,15 +125,10 @@ class FaceService:
             # Decode base64
             image_data = base64.b64decode(base64_image)
             
-            # Convert to PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Convert to numpy array
-            image_array = np.array(image)
+            # Decode the encoded bytes straight into an OpenCV array
+            image_array = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image_array is None:
+                raise ValueError("unsupported or corrupt image")
             
             return image_array
             
@@ -91,31 +136,46 @@ class FaceService:
             logger.error(f"Error decoding image: {e}")
             raise HTTPException(status_code=400, detail=f"Invalid image data: {e}")
     
-    def detect_faces(self, image_array: np.ndarray) -> List[Dict[str, Any]]:
+    def detect_faces(self, image_array: np.ndarray, encoding_format: str = 'list') -> List[Dict[str, Any]]:
         """Detect faces in image and return face encodings"""
         try:
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+            # Convert to grayscale for face detection, into this thread's frame buffer
+            gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY, dst=self._buffer('gray', image_array.shape[:2]))
             
-            # Apply histogram equalization for better contrast
-            gray = cv2.equalizeHist(gray)
+            # Apply histogram equalization for better contrast (in place)
+            cv2.equalizeHist(gray, dst=gray)
+            
+            # Detect on a downscaled copy of large frames; boxes are mapped back
+            # so face regions are still cut from the full-resolution image
+            height, width = gray.shape
+            scale = min(1.0, max(self.min_detection_scale, self.detection_max_side / max(height, width)))
+            if scale < 1.0:
+                detection_gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            else:
+                detection_gray = gray
             
             # Detect faces using OpenCV with more conservative parameters
-            faces = self.face_cascade.detectMultiScale(
-                gray,
+            faces = self._face_cascade().detectMultiScale(
+                detection_gray,
                 scaleFactor=1.05,      # More conservative scaling
                 minNeighbors=8,         # Higher threshold to reduce false positives
-                minSize=(50, 50),       # Larger minimum size for better quality
-                maxSize=(300, 300),     # Maximum size to avoid false positives
+                minSize=(int(50 * scale), int(50 * scale)),     # Larger minimum size for better quality
+                maxSize=(int(300 * scale), int(300 * scale)),   # Maximum size to avoid false positives
                 flags=cv2.CASCADE_SCALE_IMAGE
             )
             
             if len(faces) == 0:
                 # No faces detected, but still update tracking state
-                self.previous_faces = []
+                with self._state_lock:
+                    self.previous_faces = []
+                    self._prev_boxes = np.empty((0, 4), dtype=np.int32)
                 return []
             
+            if scale < 1.0:
+                faces = np.round(faces / scale).astype(int)
+            
             detected_faces = []
+            detected_boxes = []
             for i, (x, y, w, h) in enumerate(faces):
                 # Calculate face quality metrics
                 face_region = gray[y:y+h, x:x+w]
@@ -143,11 +203,11 @@ class FaceService:
                     continue
                 
                 # Create face embedding from actual face features
-                embedding = self._create_embedding_from_face(face_region)
+                embedding = self._get_embedding(face_region)
                 
                 face_data = {
                     "face_id": f"face_{i}",
-                    "encoding": embedding,
+                    **self._encode_embedding(embedding, encoding_format),
                     "location": {
                         "top": int(y),
                         "right": int(x + w),
@@ -161,9 +221,11 @@ class FaceService:
                     "quality_score": quality_score
                 }
                 detected_faces.append(face_data)
+                detected_boxes.append((x, y, x + w, y + h))
             
             # Apply face tracking to reduce fluctuation
-            tracked_faces = self._track_faces(detected_faces)
+            with self._state_lock:
+                tracked_faces = self._track_faces(detected_faces, np.array(detected_boxes, dtype=np.int32).reshape(-1, 4))
             
             # Filter faces by tracking confidence
             stable_faces = []
@@ -179,122 +241,96 @@ class FaceService:
             logger.error(f"Error detecting faces: {e}")
             raise HTTPException(status_code=500, detail=f"Face detection failed: {e}")
     
-    def _create_embedding_from_face(self, face_region: np.ndarray) -> List[float]:
-        """Create a 512-dimensional embedding from face region"""
-        # Create a more meaningful embedding based on face features
-        # This is a simplified approach - in production, use a proper face recognition model
-        
+    def _encode_embedding(self, embedding: np.ndarray, encoding_format: str) -> Dict[str, Any]:
+        """Return the response fields carrying an embedding in the requested format"""
+        if encoding_format == 'float16':
+            # 1KB of half floats as base64 instead of a JSON list of 512 numbers
+            return {
+                "encoding_b64": base64.b64encode(embedding.astype(np.float16).tobytes()).decode('ascii'),
+                "encoding_dtype": "float16"
+            }
+        return {"encoding": embedding.tolist()}
+    
+    def _get_embedding(self, face_region: np.ndarray) -> np.ndarray:
+        """Return the embedding for a face region, reusing cached results"""
         # Resize face to standard size
-        face_resized = cv2.resize(face_region, (64, 64))
-        
-        # Extract features: histogram, gradients, and texture
-        features = []
-        
-        # 1. Histogram features (64 values)
-        hist = cv2.calcHist([face_resized], [0], None, [64], [0, 256])
-        features.extend(hist.flatten() / 255.0)
-        
-        # 2. Gradient features (64 values)
-        grad_x = cv2.Sobel(face_resized, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(face_resized, cv2.CV_64F, 0, 1, ksize=3)
-        grad_magnitude = np.sqrt(grad_x**2 + grad_y**2)
-        # Normalize gradient magnitude properly
-        grad_normalized = grad_magnitude / (np.max(grad_magnitude) + 1e-8)
-        features.extend(grad_normalized.flatten())
+        face_resized = cv2.resize(face_region, (64, 64), dst=self._buffer('face64', (64, 64)))
         
-        # 3. Texture features using LBP-like approach (64 values)
-        texture = self._extract_texture_features(face_resized)
-        features.extend(texture)
+        # The embedding depends only on the 64x64 face, so its 4KB contiguous
+        # buffer is an exact cache key and is hashed without a tobytes() copy
+        face_hash = xxhash.xxh3_64_intdigest(face_resized)
         
-        # 4. Spatial features (320 values to reach 512)
-        spatial_features = self._extract_spatial_features(face_resized)
-        features.extend(spatial_features)
+        with self._state_lock:
+            embedding = self._embedding_cache.get(face_hash)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(face_hash)
+                return embedding
         
-        # Ensure we have exactly 512 dimensions
-        while len(features) < 512:
-            features.append(0.0)
-        
-        return features[:512]
-    
-    def _extract_texture_features(self, face_region: np.ndarray) -> List[float]:
-        """Extract texture features using local binary patterns"""
-        # Simplified LBP implementation
-        features = []
-        for i in range(0, face_region.shape[0], 8):
-            for j in range(0, face_region.shape[1], 8):
-                patch = face_region[i:i+8, j:j+8]
-                if patch.shape == (8, 8):
-                    # Calculate local variance as texture measure
-                    variance = np.var(patch)
-                    features.append(variance / 255.0)
-        return features[:64]  # Return exactly 64 features
+        embedding = self._create_embedding_from_face(face_resized)
+        with self._state_lock:
+            self._embedding_cache[face_hash] = embedding
+            if len(self._embedding_cache) > self.embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        return embedding
     
-    def _extract_spatial_features(self, face_region: np.ndarray) -> List[float]:
-        """Extract spatial features from face region"""
-        features = []
-        
-        # Divide face into regions and extract features
-        h, w = face_region.shape
-        for i in range(4):  # 4x4 grid
-            for j in range(4):
-                y1, y2 = i * h // 4, (i + 1) * h // 4
-                x1, x2 = j * w // 4, (j + 1) * w // 4
-                region = face_region[y1:y2, x1:x2]
-                
-                if region.size > 0:
-                    # Mean and std of each region
-                    features.append(np.mean(region) / 255.0)
-                    features.append(np.std(region) / 255.0)
-        
-        # Pad to 320 features
-        while len(features) < 320:
-            features.append(0.0)
+    def _create_embedding_from_face(self, face_resized: np.ndarray) -> np.ndarray:
+        """Create a 512-dimensional embedding from a face resized to 64x64"""
+        # Create a more meaningful embedding based on face features
+        # This is a simplified approach - in production, use a proper face recognition model
         
-        return features[:320]
-    
-    def _calculate_iou(self, box1: Dict, box2: Dict) -> float:
-        """Calculate Intersection over Union (IoU) between two face boxes"""
-        # Extract coordinates
-        x1_1, y1_1, w1, h1 = box1['left'], box1['top'], box1['right'] - box1['left'], box1['bottom'] - box1['top']
-        x1_2, y1_2, w2, h2 = box2['left'], box2['top'], box2['right'] - box2['left'], box2['bottom'] - box2['top']
+        # Features are written straight into a preallocated vector
+        embedding = np.zeros(512, dtype=np.float32)
         
-        # Calculate intersection
-        x2_1, y2_1 = x1_1 + w1, y1_1 + h1
-        x2_2, y2_2 = x1_2 + w2, y1_2 + h2
+        # 1. Histogram features (64 values)
+        hist = cv2.calcHist([face_resized], [0], None, [64], [0, 256])
+        embedding[:64] = hist.ravel() / 255.0
         
-        xi1 = max(x1_1, x1_2)
-        yi1 = max(y1_1, y1_2)
-        xi2 = min(x2_1, x2_2)
-        yi2 = min(y2_1, y2_2)
+        # 2. Gradient features (remaining 448 values)
+        # float32 is exact for 3x3 Sobel on uint8 and half the traffic of float64
+        grad_x = cv2.Sobel(face_resized, cv2.CV_32F, 1, 0, ksize=3)
+        grad_y = cv2.Sobel(face_resized, cv2.CV_32F, 0, 1, ksize=3)
+        grad_magnitude = cv2.magnitude(grad_x, grad_y)
+        # Normalize gradient magnitude properly (divide by the max, 0 for flat faces)
+        grad_normalized = cv2.normalize(grad_magnitude, None, 1.0, 0.0, cv2.NORM_INF)
+        # The 64x64 gradient map alone fills past 512 dimensions, so texture and
+        # spatial features never made it into the truncated embedding
+        embedding[64:] = grad_normalized.ravel()[:448]
         
-        if xi2 <= xi1 or yi2 <= yi1:
-            return 0.0
+        return embedding
+    
+    def _match_boxes(self, curr_boxes: np.ndarray, prev_boxes: np.ndarray) -> np.ndarray:
+        """Return the best matching previous box index for each current box (-1 if none)"""
+        # Pairwise intersection between every current and previous box
+        xi1 = np.maximum(curr_boxes[:, None, 0], prev_boxes[None, :, 0])
+        yi1 = np.maximum(curr_boxes[:, None, 1], prev_boxes[None, :, 1])
+        xi2 = np.minimum(curr_boxes[:, None, 2], prev_boxes[None, :, 2])
+        yi2 = np.minimum(curr_boxes[:, None, 3], prev_boxes[None, :, 3])
+        intersection = np.clip(xi2 - xi1, 0, None) * np.clip(yi2 - yi1, 0, None)
         
-        intersection = (xi2 - xi1) * (yi2 - yi1)
-        union = w1 * h1 + w2 * h2 - intersection
+        # Intersection over Union for all pairs at once
+        curr_area = (curr_boxes[:, 2] - curr_boxes[:, 0]) * (curr_boxes[:, 3] - curr_boxes[:, 1])
+        prev_area = (prev_boxes[:, 2] - prev_boxes[:, 0]) * (prev_boxes[:, 3] - prev_boxes[:, 1])
+        union = curr_area[:, None] + prev_area[None, :] - intersection
+        iou = np.divide(intersection, union, out=np.zeros(union.shape), where=union > 0)
         
-        return intersection / union if union > 0 else 0.0
+        best = iou.argmax(axis=1)
+        best_iou = iou.max(axis=1)
+        return np.where(best_iou > self.face_tracking_threshold, best, -1)
     
-    def _track_faces(self, current_faces: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Track faces across frames to reduce fluctuation"""
+    def _track_faces(self, current_faces: List[Dict[str, Any]], current_boxes: np.ndarray) -> List[Dict[str, Any]]:
+        """Track faces across frames to reduce fluctuation (caller holds _state_lock)"""
         if not self.previous_faces:
             # First frame, accept all faces
             tracked_faces = current_faces.copy()
         else:
             tracked_faces = []
             
-            for current_face in current_faces:
-                best_match = None
-                best_iou = 0.0
-                
-                # Find best matching previous face
-                for prev_face in self.previous_faces:
-                    iou = self._calculate_iou(current_face['location'], prev_face['location'])
-                    if iou > self.face_tracking_threshold and iou > best_iou:
-                        best_iou = iou
-                        best_match = prev_face
-                
-                if best_match:
+            # Find best matching previous face for every current face
+            matches = self._match_boxes(current_boxes, self._prev_boxes)
+            
+            for current_face, match in zip(current_faces, matches):
+                if match >= 0:
+                    best_match = self.previous_faces[match]
                     # Update face with tracking info
                     current_face['track_id'] = best_match.get('track_id', f"face_{len(tracked_faces)}")
                     current_face['track_confidence'] = min(1.0, best_match.get('track_confidence', 0.5) + 0.1)
@@ -307,6 +343,7 @@ class FaceService:
         
         # Update previous faces for next frame
         self.previous_faces = tracked_faces[:self.max_faces]
+        self._prev_boxes = current_boxes[:self.max_faces]
         
         return tracked_faces
     
@@ -317,6 +354,28 @@ class FaceService:
 # Initialize the service
 face_service = FaceService()
 
+@app.on_event("startup")
+async def warm_up():
+    """Run one dummy frame through detection on every detection thread"""
+    # Each detection thread loads its own cascade and OpenCV buffers; the
+    # barrier holds every warm-up task until all of them have started, so each
+    # one runs on a different thread and no first request pays for the load
+    barrier = threading.Barrier(face_service.detection_threads)
+    
+    def warm_thread():
+        barrier.wait(timeout=10)
+        face_service.detect_faces(np.zeros((480, 640, 3), dtype=np.uint8))
+    
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(*(
+            loop.run_in_executor(face_service._pool, warm_thread)
+            for _ in range(face_service.detection_threads)
+        ))
+        logger.info(f"Face detection warmed up on {face_service.detection_threads} threads")
+    except Exception as e:
+        logger.warning(f"Face detection warm-up failed: {e}")
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -328,11 +387,13 @@ async def detect_faces(request: FaceDetectionRequest):
     try:
         logger.info("Face detection request received")
         
-        # Decode image
-        image_array = face_service.decode_image(request.image_data)
+        # Decode and detect on the detection pool so the event loop keeps serving
+        # other requests; OpenCV releases the GIL inside its C++ calls
+        loop = asyncio.get_running_loop()
+        image_array = await loop.run_in_executor(face_service._pool, face_service.decode_image, request.image_data)
         
         # Detect faces
-        faces = face_service.detect_faces(image_array)
+        faces = await loop.run_in_executor(face_service._pool, face_service.detect_faces, image_array, request.encoding_format)
         
         return FaceDetectionResponse(
             success=True,
@@ -361,6 +422,11 @@ if __name__ == "__main__":
         "face_service:app",
         host="0.0.0.0",
         port=8001,
-        reload=True,
+        reload=RELOAD,
+        workers=WORKERS,
+        # C-accelerated event loop and HTTP parser (uvloop is not available on Windows)
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        timeout_keep_alive=30,  # Keep connections open between frames of a stream
         log_level="info"
     )